@@ -0,0 +1,97 @@
+import math
+from collections import namedtuple
+
+import pytest
+import torch
+
+pytest.importorskip("vllm_hpu_extension")
+pytest.importorskip("habana_frameworks")
+
+from vllm.attention.backends.hpu_attn import HPUAttentionImpl  # noqa: E402
+from vllm.worker.hpu_model_runner import (HpuModelAdapter,  # noqa: E402
+                                          _make_alibi_bias)
+
+NUM_HEADS = [1, 8]
+SEQ_LENS = [1, 7, 16, 129]
+DTYPES = [torch.float32, torch.bfloat16]
+
+PromptMetadata = namedtuple("PromptMetadata", ["seq_lens_tensor", "attn_bias"])
+
+
+def ref_alibi_bias(alibi_slopes: torch.Tensor, dtype: torch.dtype,
+                   seq_len: int) -> torch.Tensor:
+    bias = torch.arange(seq_len, dtype=dtype)
+    bias = bias[None, :] - bias[:, None]
+
+    padded_len = (seq_len + 7) // 8 * 8
+    num_heads = alibi_slopes.shape[0]
+    bias = torch.empty(
+        1,  # batch size
+        num_heads,
+        seq_len,
+        padded_len,
+        device=alibi_slopes.device,
+        dtype=dtype,
+    )[:, :, :, :seq_len].copy_(bias)
+    bias.mul_(alibi_slopes[:, None, None])
+    return bias
+
+
+def make_slopes(num_heads: int) -> torch.Tensor:
+    return torch.tensor([2**(-(i + 1)) for i in range(num_heads)],
+                        dtype=torch.bfloat16)
+
+
+def make_attn_impl(num_heads: int, num_kv_heads: int) -> HPUAttentionImpl:
+    return HPUAttentionImpl(num_heads=num_heads,
+                            head_size=64,
+                            scale=1.0,
+                            num_kv_heads=num_kv_heads,
+                            alibi_slopes=make_slopes(num_heads).tolist(),
+                            sliding_window=None,
+                            kv_cache_dtype="auto")
+
+
+@pytest.mark.parametrize("num_heads", NUM_HEADS)
+@pytest.mark.parametrize("seq_len", SEQ_LENS)
+@pytest.mark.parametrize("dtype", DTYPES)
+def test_make_alibi_bias(num_heads, seq_len, dtype):
+    slopes = make_slopes(num_heads)
+    out = _make_alibi_bias(slopes, dtype, seq_len)
+    ref = ref_alibi_bias(slopes, dtype, seq_len)
+    assert out.shape == ref.shape
+    assert out.dtype == ref.dtype
+    torch.testing.assert_close(out, ref, rtol=0, atol=0)
+
+
+@pytest.mark.parametrize("num_heads", NUM_HEADS)
+def test_adapter_adds_alibi_to_attn_bias(monkeypatch, num_heads):
+    monkeypatch.setenv("VLLM_USE_FAKE_HPU", "1")
+    dtype = torch.float32
+    model = torch.nn.ModuleList([make_attn_impl(num_heads, num_heads)])
+    adapter = HpuModelAdapter(model,
+                              block_size=128,
+                              dtype=dtype,
+                              enforce_eager=True)
+
+    seq_lens = [3, 5]
+    batch_size, seq_len = len(seq_lens), max(seq_lens)
+    metadata = PromptMetadata(seq_lens_tensor=torch.tensor(seq_lens),
+                              attn_bias=None)
+    attn_bias = adapter._set_attn_bias(metadata, batch_size, seq_len,
+                                       torch.device("cpu"), dtype).attn_bias
+
+    mask = torch.zeros(batch_size, 1, seq_len, seq_len, dtype=dtype)
+    for b, length in enumerate(seq_lens):
+        for i in range(seq_len):
+            for j in range(seq_len):
+                if j > i or j >= length:
+                    mask[b, 0, i, j] = -math.inf
+    expected = mask + ref_alibi_bias(make_slopes(num_heads), dtype, seq_len)
+    assert attn_bias.shape == (batch_size, num_heads, seq_len, seq_len)
+    torch.testing.assert_close(attn_bias, expected, rtol=0, atol=0)
+
+
+def test_alibi_rejected_with_gqa():
+    with pytest.raises(NotImplementedError):
+        make_attn_impl(num_heads=8, num_kv_heads=2)
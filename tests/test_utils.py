@@ -7,7 +7,8 @@ from typing import AsyncIterator, Tuple
 import pytest
 
 from vllm.utils import (FlexibleArgumentParser, deprecate_kwargs,
-                        get_open_port, merge_async_iterators, supports_kw)
+                        get_env_flag, get_open_port, hpu_prompt_use_fusedsdpa,
+                        merge_async_iterators, supports_kw)
 
 from .utils import error_on_warning
 
@@ -266,3 +267,35 @@ def test_supports_kw(callable,kw_name,requires_kw_only,
         requires_kw_only=requires_kw_only,
         allow_var_kwargs=allow_var_kwargs
     ) == is_supported
+
+
+@pytest.mark.parametrize(("value", "expected"), [
+    ("1", True),
+    ("true", True),
+    ("True", True),
+    ("on", True),
+    ("0", False),
+    ("false", False),
+    ("", False),
+])
+def test_get_env_flag(monkeypatch, value, expected):
+    monkeypatch.setenv("VLLM_TEST_ENV_FLAG", value)
+    assert get_env_flag("VLLM_TEST_ENV_FLAG") is expected
+
+
+def test_get_env_flag_default(monkeypatch):
+    monkeypatch.delenv("VLLM_TEST_ENV_FLAG", raising=False)
+    assert get_env_flag("VLLM_TEST_ENV_FLAG") is False
+    assert get_env_flag("VLLM_TEST_ENV_FLAG", "true") is True
+
+
+def test_hpu_prompt_use_fusedsdpa_is_read_once(monkeypatch):
+    hpu_prompt_use_fusedsdpa.cache_clear()
+    try:
+        monkeypatch.setenv("VLLM_PROMPT_USE_FUSEDSDPA", "1")
+        assert hpu_prompt_use_fusedsdpa() is True
+        # Later changes must not make the runner and backend disagree.
+        monkeypatch.setenv("VLLM_PROMPT_USE_FUSEDSDPA", "0")
+        assert hpu_prompt_use_fusedsdpa() is True
+    finally:
+        hpu_prompt_use_fusedsdpa.cache_clear()
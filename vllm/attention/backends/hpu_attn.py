@@ -2,7 +2,6 @@
 # Copyright (C) 2024 Habana Labs, Ltd. an Intel Company
 ###############################################################################
 
-import os
 from dataclasses import dataclass
 from typing import Any, Dict, List, Optional, Tuple, Type
 
@@ -16,6 +15,7 @@ from vllm.attention.backends.utils import CommonAttentionState
 from vllm.attention.ops.hpu_paged_attn import (HPUPagedAttention,
                                                HPUPagedAttentionMetadata)
 from vllm.logger import init_logger
+from vllm.utils import hpu_prompt_use_fusedsdpa
 
 logger = init_logger(__name__)
 
@@ -85,6 +85,10 @@ class HPUAttentionImpl(AttentionImpl, torch.nn.Module):
 
     The prompts might have different lengths, while the generation tokens
     always have length 1.
+
+    Only decoder self-attention is implemented. Encoder/decoder models are
+    rejected when the HPU worker is created, so `attn_type` is not checked
+    on every forward call.
     """
 
     def __init__(
@@ -113,18 +117,32 @@ class HPUAttentionImpl(AttentionImpl, torch.nn.Module):
         self.sliding_window = sliding_window
         self.alibi_slopes = alibi_slopes
         if alibi_slopes is not None:
+            if self.num_kv_heads != num_heads:
+                # ops.prompt_attention only takes a per-kv-head bias, which
+                # cannot carry per-query-head slopes.
+                raise NotImplementedError(
+                    "ALiBi is not supported with grouped-query attention "
+                    "on HPU.")
             alibi_slopes_tensor = torch.tensor(alibi_slopes,
                                                dtype=torch.bfloat16)
+            # HpuModelAdapter adds the ALiBi bias to attn_bias once per step,
+            # since it is the same for every layer.
             self.alibi_slopes = alibi_slopes_tensor
         assert self.num_heads % self.num_kv_heads == 0
         self.num_queries_per_kv = self.num_heads // self.num_kv_heads
 
-        self.prefill_usefusedsdpa = os.getenv('VLLM_PROMPT_USE_FUSEDSDPA',
-                                              '0').lower() in ['1', 'true']
+        self.prefill_usefusedsdpa = hpu_prompt_use_fusedsdpa()
         if self.prefill_usefusedsdpa:
             assert alibi_slopes is None, \
                 'Prefill with FusedSDPA not supported with alibi slopes!'
 
+        # The prompt attention variant only depends on static configuration,
+        # so pick it once here instead of branching on every forward call.
+        if self.prefill_usefusedsdpa:
+            self._forward_prompt_fn = self._forward_prompt_fusedsdpa
+        else:
+            self._forward_prompt_fn = self._forward_prompt
+
         suppored_head_sizes = HPUPagedAttention.get_supported_head_sizes()
         if head_size not in suppored_head_sizes:
             raise ValueError(
@@ -153,22 +171,19 @@ class HPUAttentionImpl(AttentionImpl, torch.nn.Module):
         Returns:
             shape = [num_tokens, num_heads * head_size]
         """
-        if attn_type != AttentionType.DECODER:
-            raise NotImplementedError("Encoder self-attention and "
-                                      "encoder/decoder cross-attention "
-                                      "are not implemented for "
-                                      "HPUAttentionImpl")
         batch_size, seq_len, hidden_size = query.shape
         _, seq_len_kv, _ = key.shape
 
-        query = query.view(-1, self.num_heads, self.head_size)
-        key = key.view(-1, self.num_kv_heads, self.head_size)
-        value = value.view(-1, self.num_kv_heads, self.head_size)
+        query_shape = (batch_size, seq_len, self.num_heads, self.head_size)
+        kv_shape = (batch_size, seq_len_kv, self.num_kv_heads, self.head_size)
         block_indices = attn_metadata.block_indices
         block_offsets = attn_metadata.block_offsets
         if attn_metadata.is_prompt:
-            key = key.unflatten(0, (block_indices.size(0), -1))
-            value = value.unflatten(0, (block_indices.size(0), -1))
+            # Prompts are written to the cache in whole blocks.
+            cache_kv_shape = (block_indices.size(0), -1, self.num_kv_heads,
+                              self.head_size)
+        else:
+            cache_kv_shape = (-1, self.num_kv_heads, self.head_size)
         if kv_cache is not None:
             key_cache, value_cache = HPUPagedAttention.split_kv_cache(
                 kv_cache, self.num_kv_heads, self.head_size)
@@ -176,90 +191,86 @@ class HPUAttentionImpl(AttentionImpl, torch.nn.Module):
             # Reshape the input keys and values and store them in the cache.
             # If kv_cache is not provided, the new key and value tensors are
             # not cached. This happens during the initial memory profiling run.
-            key_cache = self.k_cache(key, key_cache, block_indices,
-                                     block_offsets)
-            value_cache = self.v_cache(value, value_cache, block_indices,
-                                       block_offsets)
+            key_cache = self.k_cache(key.view(cache_kv_shape), key_cache,
+                                     block_indices, block_offsets)
+            value_cache = self.v_cache(value.view(cache_kv_shape), value_cache,
+                                       block_indices, block_offsets)
 
         if attn_metadata.is_prompt:
             # Prompt run.
-            if not self.prefill_usefusedsdpa:
-                # TODO: move this outside of model
-                assert attn_metadata.attn_bias is not None, \
-                        'attn_bias must be set before calling model.forward!'
-                attn_bias = attn_metadata.attn_bias
-                if self.alibi_slopes is not None:
-                    position_bias = _make_alibi_bias(self.alibi_slopes,
-                                                     self.num_kv_heads,
-                                                     attn_bias.dtype,
-                                                     attn_bias.shape[-1])
-                    attn_bias = attn_bias.tile((1, self.num_kv_heads, 1, 1))
-                    attn_bias.add_(position_bias)
-            else:
-                attn_bias = None
-
-            query_shape = (batch_size, seq_len, self.num_heads, self.head_size)
-            kv_shape = (batch_size, seq_len_kv, self.num_kv_heads,
-                        self.head_size)
-            out = ops.prompt_attention(
-                query.view(query_shape),
-                key.view(kv_shape),
-                value.view(kv_shape),
-                attn_bias=attn_bias,
-                p=0.0,
-                scale=self.scale,
-                matmul_qk_op=self.matmul_qk,
-                softmax_op=self.softmax,
-                matmul_av_op=self.matmul_av,
-            )
+            out = self._forward_prompt_fn(query.view(query_shape),
+                                          key.view(kv_shape),
+                                          value.view(kv_shape), attn_metadata)
             output = out.reshape(batch_size, seq_len, hidden_size)
         else:
             # Decoding run.
-            output = HPUPagedAttention.forward_decode(
-                query=query,
-                key_cache=key_cache,
-                value_cache=value_cache,
-                block_list=attn_metadata.block_list,
-                block_mapping=attn_metadata.block_mapping,
-                block_bias=attn_metadata.attn_bias,
-                block_scales=attn_metadata.block_scales,
-                block_groups=attn_metadata.block_groups,
-                scale=self.scale,
-                matmul_qk_op=self.matmul_qk,
-                matmul_av_op=self.matmul_av,
-                keys_fetch_func=self.k_cache.fetch_from_cache,
-                values_fetch_func=self.v_cache.fetch_from_cache)
+            output = self._forward_decode(
+                query.view(-1, self.num_heads, self.head_size), key_cache,
+                value_cache, attn_metadata)
         # Reshape the output tensor.
         return output.view(batch_size, seq_len, hidden_size)
 
+    def _forward_prompt_fusedsdpa(
+        self,
+        query: torch.Tensor,
+        key: torch.Tensor,
+        value: torch.Tensor,
+        attn_metadata: HPUAttentionMetadata,
+    ) -> torch.Tensor:
+        return self._prompt_attention(query, key, value, attn_bias=None)
+
+    def _forward_prompt(
+        self,
+        query: torch.Tensor,
+        key: torch.Tensor,
+        value: torch.Tensor,
+        attn_metadata: HPUAttentionMetadata,
+    ) -> torch.Tensor:
+        # attn_bias, including the ALiBi bias if any, is built by
+        # HpuModelAdapter before the model runs.
+        assert attn_metadata.attn_bias is not None, \
+                'attn_bias must be set before calling model.forward!'
+        return self._prompt_attention(query, key, value,
+                                      attn_metadata.attn_bias)
+
+    def _prompt_attention(
+        self,
+        query: torch.Tensor,
+        key: torch.Tensor,
+        value: torch.Tensor,
+        attn_bias: Optional[torch.Tensor],
+    ) -> torch.Tensor:
+        return ops.prompt_attention(
+            query,
+            key,
+            value,
+            attn_bias=attn_bias,
+            p=0.0,
+            scale=self.scale,
+            matmul_qk_op=self.matmul_qk,
+            softmax_op=self.softmax,
+            matmul_av_op=self.matmul_av,
+        )
+
+    def _forward_decode(
+        self,
+        query: torch.Tensor,
+        key_cache: torch.Tensor,
+        value_cache: torch.Tensor,
+        attn_metadata: HPUAttentionMetadata,
+    ) -> torch.Tensor:
+        return HPUPagedAttention.forward_decode(
+            query=query,
+            key_cache=key_cache,
+            value_cache=value_cache,
+            block_list=attn_metadata.block_list,
+            block_mapping=attn_metadata.block_mapping,
+            block_bias=attn_metadata.attn_bias,
+            block_scales=attn_metadata.block_scales,
+            block_groups=attn_metadata.block_groups,
+            scale=self.scale,
+            matmul_qk_op=self.matmul_qk,
+            matmul_av_op=self.matmul_av,
+            keys_fetch_func=self.k_cache.fetch_from_cache,
+            values_fetch_func=self.v_cache.fetch_from_cache)
 
-def _make_alibi_bias(
-    alibi_slopes: torch.Tensor,
-    num_kv_heads: int,
-    dtype: torch.dtype,
-    seq_len: int,
-) -> torch.Tensor:
-    bias = torch.arange(seq_len, dtype=dtype)
-    # NOTE(zhuohan): HF uses
-    #     `bias = bias[None, :].repeat(seq_len, 1)`
-    # here. We find that both biases give the same results, but
-    # the bias below more accurately follows the original ALiBi
-    # paper.
-    # Calculate a matrix where each element represents ith element- jth
-    # element.
-    bias = bias[None, :] - bias[:, None]
-
-    padded_len = (seq_len + 7) // 8 * 8
-    num_heads = alibi_slopes.shape[0]
-    bias = torch.empty(
-        1,  # batch size
-        num_heads,
-        seq_len,
-        padded_len,
-        device=alibi_slopes.device,
-        dtype=dtype,
-    )[:, :, :, :seq_len].copy_(bias)
-    bias.mul_(alibi_slopes[:, None, None])
-    if num_heads != num_kv_heads:
-        bias = bias.unflatten(1, (num_kv_heads, num_heads // num_kv_heads))
-    return bias
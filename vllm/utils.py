@@ -349,6 +349,18 @@ def is_fake_hpu() -> bool:
     return os.environ.get('VLLM_USE_FAKE_HPU', '0') != '0'
 
 
+def get_env_flag(name: str, default: str = '0') -> bool:
+    """Parse a boolean environment variable such as `VLLM_SKIP_WARMUP`."""
+    return os.environ.get(name, default).lower() in ('1', 'true', 'yes', 'on')
+
+
+@lru_cache(maxsize=None)
+def hpu_prompt_use_fusedsdpa() -> bool:
+    # Cached so that the model runner (which builds attn_bias) and the HPU
+    # attention backend (which expects it) always agree.
+    return get_env_flag('VLLM_PROMPT_USE_FUSEDSDPA')
+
+
 @lru_cache(maxsize=None)
 def hpu_device_string():
     device_string = 'hpu' if not is_fake_hpu() else 'cpu'
@@ -26,6 +26,7 @@ from vllm_hpu_extension.profiler import (HabanaHighLevelProfiler,
                                          HabanaMemoryProfiler, format_bytes)
 
 from vllm.attention import AttentionMetadata, get_attn_backend
+from vllm.attention.backends.hpu_attn import HPUAttentionImpl
 from vllm.config import (CacheConfig, DeviceConfig, LoadConfig, LoRAConfig,
                          ModelConfig, ObservabilityConfig, ParallelConfig,
                          PromptAdapterConfig, SchedulerConfig)
@@ -43,8 +44,8 @@ from vllm.multimodal import (MULTIMODAL_REGISTRY, BatchedTensorInputs,
 from vllm.sampling_params import SamplingParams
 from vllm.sequence import (IntermediateTensors, SequenceData,
                            SequenceGroupMetadata)
-from vllm.utils import (is_fake_hpu, is_pin_memory_available,
-                        make_tensor_with_pad)
+from vllm.utils import (get_env_flag, hpu_prompt_use_fusedsdpa, is_fake_hpu,
+                        is_pin_memory_available, make_tensor_with_pad)
 from vllm.worker.model_runner_base import (
     ModelRunnerBase, ModelRunnerInputBase,
     _add_attn_metadata_broadcastable_dict,
@@ -275,20 +276,48 @@ def precompute_indices_and_offsets(block_size, slot_mapping, is_prompt):
     return indices, offsets
 
 
+def _make_alibi_bias(
+    alibi_slopes: torch.Tensor,
+    dtype: torch.dtype,
+    seq_len: int,
+) -> torch.Tensor:
+    bias = torch.arange(seq_len, dtype=dtype, device=alibi_slopes.device)
+    # NOTE(zhuohan): HF uses
+    #     `bias = bias[None, :].repeat(seq_len, 1)`
+    # here. We find that both biases give the same results, but
+    # the bias below more accurately follows the original ALiBi
+    # paper.
+    # Calculate a matrix where each element represents ith element- jth
+    # element.
+    bias = bias[None, :] - bias[:, None]
+
+    # A single broadcast multiply yields the [1, num_heads, seq_len, seq_len]
+    # bias directly, without an intermediate buffer to copy into.
+    return bias * alibi_slopes.to(dtype).view(1, -1, 1, 1)
+
+
 class HpuModelAdapter():
 
     def __init__(self, model, block_size, dtype, enforce_eager):
         self.model = model
-        self.prefill_use_fusedsdpa = os.getenv('VLLM_PROMPT_USE_FUSEDSDPA',
-                                               '0').lower() in ['1', 'true']
+        self.prefill_use_fusedsdpa = hpu_prompt_use_fusedsdpa()
         self.block_size = block_size
         self.dtype = dtype
+        self.alibi_slopes = self._get_alibi_slopes(model)
         if not is_fake_hpu() and not htorch.utils.internal.is_lazy(
         ) and not enforce_eager:
             self.model = torch.compile(self.model,
                                        backend='hpu_backend',
                                        dynamic=False)
 
+    @staticmethod
+    def _get_alibi_slopes(model) -> Optional[torch.Tensor]:
+        # All attention layers of a model share the same ALiBi slopes.
+        for module in model.modules():
+            if isinstance(module, HPUAttentionImpl):
+                return module.alibi_slopes
+        return None
+
     def _set_attn_bias(self, attn_metadata, batch_size, seq_len, device,
                        dtype):
         prefill_metadata = attn_metadata
@@ -307,6 +336,12 @@ class HpuModelAdapter():
         mask = causal_mask.logical_or(len_mask)
         attn_bias = (torch.zeros_like(mask, dtype=dtype).masked_fill_(
             mask, -math.inf))
+        if self.alibi_slopes is not None:
+            # The ALiBi bias is the same for every layer, so it is added to
+            # the mask once per step. Broadcasting over heads in the add
+            # avoids materializing a tiled copy of the mask first.
+            attn_bias = attn_bias + _make_alibi_bias(
+                self.alibi_slopes.to(device), dtype, seq_len)
         attn_metadata = prefill_metadata._replace(attn_bias=attn_bias)
         return attn_metadata
 
@@ -619,8 +654,7 @@ class HPUModelRunnerBase(ModelRunnerBase[TModelInputForHPU]):
         self.multi_modal_input_mapper = MULTIMODAL_REGISTRY \
             .create_input_mapper(self.model_config)
 
-        self.skip_warmup = os.environ.get('VLLM_SKIP_WARMUP',
-                                          'false').lower() == 'true'
+        self.skip_warmup = get_env_flag('VLLM_SKIP_WARMUP')
 
     def load_model(self) -> None:
         import habana_frameworks.torch.core as htcore
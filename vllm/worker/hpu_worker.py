@@ -79,6 +79,11 @@ class HPUWorker(LocalOrDistributedWorkerBase):
             from vllm.utils import init_cached_hf_modules
             init_cached_hf_modules()
 
+        if self.model_config.is_encoder_decoder_model:
+            # HPUAttentionImpl only implements decoder self-attention.
+            raise NotImplementedError("Encoder/decoder models are not "
+                                      "currently supported on HPU.")
+
         self.model_runner: HPUModelRunner = HPUModelRunner(
             model_config,
             parallel_config,